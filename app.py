@@ -1,13 +1,19 @@
 # app.py
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from sqlalchemy import func, delete, select, update
+from datetime import datetime, timedelta
+from sqlalchemy import func, delete, select, update, insert, cast, BigInteger
 from sqlalchemy.exc import IntegrityError 
 import random
 import os
+import atexit
+import json
+import threading
+import uuid
 from sqlalchemy import func, extract
+from previsao import ModeloDemanda, dia_da_semana
+from auditoria import BufferAuditoria
 
 
 # 💡 Documentação: Inicialização
@@ -25,13 +31,28 @@ if database_url:
     
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     print("Usando PostgreSQL (Produção)")
+
+    # Chave que assina o cookie de sessão do login (o mesmo valor em todos os workers).
+    # Sem ela qualquer um poderia forjar a sessão, então em produção é obrigatória.
+    secret_key = os.environ.get('SECRET_KEY')
+    if not secret_key:
+        raise RuntimeError('SECRET_KEY não definida: configure a variável de ambiente SECRET_KEY junto com DATABASE_URL.')
+    app.secret_key = secret_key
 else:
     # Versão local (SQLite)
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///padaria.db'
     print("Usando SQLite (Desenvolvimento Local)")
 
+    # Chave fixa apenas para desenvolvimento local
+    app.secret_key = os.environ.get('SECRET_KEY', 'pao-fresquim-dev')
+
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Com vários caixas gravando ao mesmo tempo, o SQLite serializa as escritas:
+    # a conexão espera a vez (até 30s) em vez de falhar com "database is locked"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+
 db = SQLAlchemy(app)
 
 # ----------------------------------------------------
@@ -79,6 +100,11 @@ class Venda(db.Model):
     
     # AJUSTE 1: Novo campo para armazenar a forma de pagamento
     forma_pagamento = db.Column(db.String(50), nullable=False, default='Dinheiro') # <--- NOVO CAMPO
+
+    # Relatórios e séries filtram vendas por período
+    __table_args__ = (
+        db.Index('ix_venda_data', 'data_venda'),
+    )
     
     itens = db.relationship('VendaProduto', backref='venda', lazy=True, cascade="all, delete-orphan")
     cliente = db.relationship('Cliente', backref='vendas')
@@ -98,6 +124,56 @@ class VendaProduto(db.Model):
     def __repr__(self):
         return f'<ItemVenda Venda:{self.venda_id} Produto:{self.produto_id}>'
 
+class VendaIdempotencia(db.Model):
+    # Chave única enviada com cada formulário/requisição de venda.
+    # Um segundo envio com a mesma chave (duplo clique, reenvio) não cria outra Venda.
+    id = db.Column(db.Integer, primary_key=True)
+    chave = db.Column(db.String(64), unique=True, nullable=False)
+    venda_id = db.Column(db.Integer, db.ForeignKey('venda.id'), nullable=False)
+    data_registro = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    venda = db.relationship('Venda', backref=db.backref('chaves_idempotencia', cascade="all, delete-orphan"))
+
+    def __repr__(self):
+        return f'<VendaIdempotencia {self.chave} Venda:{self.venda_id}>'
+
+class RegistroAuditoria(db.Model):
+    # Quem fez o quê e quando, com os valores antes e depois (JSON).
+    # Sem chave estrangeira: o registro precisa sobreviver à exclusão da entidade/funcionário.
+    id = db.Column(db.Integer, primary_key=True)
+    data_registro = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    funcionario_id = db.Column(db.Integer, nullable=True)
+    username = db.Column(db.String(80), nullable=True)
+    acao = db.Column(db.String(20), nullable=False) # criar, editar, excluir
+    entidade = db.Column(db.String(50), nullable=False)
+    entidade_id = db.Column(db.Integer, nullable=True)
+    dados_antes = db.Column(db.Text, nullable=True)
+    dados_depois = db.Column(db.Text, nullable=True)
+
+    # Índices para /api/auditoria: por entidade e período, por registro específico
+    # (entidade + id) e período, e só por período. A data fica sempre por último
+    # para que o filtro de intervalo e o ORDER BY usem o próprio índice.
+    __table_args__ = (
+        db.Index('ix_auditoria_entidade_data', 'entidade', 'data_registro'),
+        db.Index('ix_auditoria_entidade_id_data', 'entidade', 'entidade_id', 'data_registro'),
+        db.Index('ix_auditoria_data', 'data_registro'),
+    )
+
+    def __repr__(self):
+        return f'<RegistroAuditoria {self.acao} {self.entidade}:{self.entidade_id}>'
+
+# Cria as tabelas que ainda não existem (ex.: venda_idempotencia num banco antigo).
+# Fica fora do bloco __main__ porque o gunicorn importa o módulo sem executá-lo.
+with app.app_context():
+    try:
+        db.create_all()
+        # create_all não acrescenta índices a tabelas que já existiam
+        for indice in Venda.__table__.indexes:
+            indice.create(db.engine, checkfirst=True)
+    except Exception as e:
+        # Vários workers subindo juntos podem disputar o CREATE TABLE; um deles vence
+        print(f"Aviso ao criar tabelas: {e}")
+
 # ----------------------------------------------------
 # 📌 FUNÇÕES AUXILIARES E FILTROS JINJA2
 # ----------------------------------------------------
@@ -112,6 +188,67 @@ def check_login():
         return redirect(url_for('login'))
     return None # Retorna None se estiver logado
 
+# ----------------------------------------------------
+# 📌 AUDITORIA
+# ----------------------------------------------------
+
+# Campos que nunca vão para o log (apenas indicamos que mudaram)
+CAMPOS_OCULTOS_AUDITORIA = {'password'}
+
+def _gravar_lote_auditoria(lote):
+    # Contexto próprio: não mistura com a sessão da requisição em andamento
+    with app.app_context():
+        db.session.execute(insert(RegistroAuditoria), lote)
+        db.session.commit()
+
+buffer_auditoria = BufferAuditoria(_gravar_lote_auditoria)
+atexit.register(buffer_auditoria.descarregar)
+
+def dados_auditoria(obj, itens=None):
+    """
+    Fotografia das colunas de um modelo (e dos itens, no caso de Venda).
+
+    Passe `itens` quando já estiverem em memória, para não recarregar a coleção.
+    """
+    dados = {}
+    for coluna in obj.__table__.columns:
+        valor = getattr(obj, coluna.name)
+        if coluna.name in CAMPOS_OCULTOS_AUDITORIA:
+            valor = '***'
+        elif isinstance(valor, datetime):
+            valor = valor.isoformat()
+        dados[coluna.name] = valor
+    if isinstance(obj, Venda):
+        dados['itens'] = [{
+            'produto_id': item.produto_id,
+            'quantidade': item.quantidade,
+            'preco_unitario': item.preco_unitario,
+        } for item in (obj.itens if itens is None else itens)]
+    return dados
+
+def registrar_auditoria(acao, obj, antes=None, depois=None):
+    """
+    Enfileira um registro de auditoria. Chamar somente após o commit, fora do
+    try da operação: nunca levanta exceção, porque a alteração já está gravada
+    e uma falha aqui não pode ser mostrada ao usuário como erro dela.
+    """
+    # O id vem da fotografia: após o commit o objeto está expirado e ler obj.id faria um SELECT
+    dados = depois if depois is not None else antes
+    try:
+        entidade_id = dados['id'] if dados is not None else obj.id
+        buffer_auditoria.registrar({
+            'data_registro': datetime.now(),
+            'funcionario_id': session.get('user_id'),
+            'username': session.get('username'),
+            'acao': acao,
+            'entidade': type(obj).__name__,
+            'entidade_id': entidade_id,
+            'dados_antes': json.dumps(antes, ensure_ascii=False) if antes is not None else None,
+            'dados_depois': json.dumps(depois, ensure_ascii=False) if depois is not None else None,
+        })
+    except Exception as e:
+        print(f"Erro ao registrar auditoria ({acao} {type(obj).__name__}): {e}")
+
 
 
 #Condição: O último dígito é ímpar (ultimo_digito % 2 != 0).
@@ -198,12 +335,21 @@ def logout():
 def menu_vendas():
     return check_login() or render_template('menu_vendas.html')
 
+def _venda_por_chave(chave):
+    """Id da venda já registrada com esta chave de idempotência, ou None."""
+    return db.session.execute(
+        select(VendaIdempotencia.venda_id).filter_by(chave=chave)
+    ).scalar_one_or_none()
+
 @app.route('/registrar/venda', methods=['GET', 'POST'])
 def registrar_venda():
     if not check_login() is None:
         return check_login()
 
     if request.method == 'POST':
+        # Chave de idempotência: cabeçalho Idempotency-Key (API) ou campo oculto do formulário
+        chave = (request.headers.get('Idempotency-Key') or request.form.get('chave_idempotencia') or '').strip()[:64] or None
+
         cliente_id_str = request.form.get('cliente_id')
         cliente_id = int(cliente_id_str) if cliente_id_str else None
         
@@ -220,15 +366,34 @@ def registrar_venda():
         subtotal = 0.0 
 
         try:
-            for produto_id_str, quantidade_str in zip(produto_ids, quantidades):
-                if not produto_id_str or not quantidade_str:
-                    continue
-                
-                produto_id = int(produto_id_str)
-                quantidade = int(quantidade_str)
-
-                produto = db.get_or_404(Produto, produto_id)
-                preco_unitario = produto.valor
+            if chave:
+                venda_existente = _venda_por_chave(chave)
+                if venda_existente is not None:
+                    flash(f'Venda #{venda_existente} já havia sido registrada (envio repetido ignorado).', 'success')
+                    return redirect(url_for('lista_vendas'))
+
+            itens_pedidos = [
+                (int(produto_id_str), int(quantidade_str))
+                for produto_id_str, quantidade_str in zip(produto_ids, quantidades)
+                if produto_id_str and quantidade_str
+            ]
+
+            # Lê todos os preços numa consulta só. No PostgreSQL as linhas ficam
+            # travadas (FOR SHARE, em ordem de id para evitar deadlock) até o commit:
+            # um editar_produto concorrente espera a venda terminar, e a venda
+            # grava exatamente o preço que leu. No SQLite as escritas já são serializadas.
+            ids_pedidos = sorted({produto_id for produto_id, _ in itens_pedidos})
+            precos = dict(db.session.execute(
+                select(Produto.id, Produto.valor)
+                .where(Produto.id.in_(ids_pedidos))
+                .order_by(Produto.id)
+                .with_for_update(read=True)
+            ).all())
+
+            for produto_id, quantidade in itens_pedidos:
+                if produto_id not in precos:
+                    abort(404)
+                preco_unitario = precos[produto_id]
                 
                 if quantidade <= 0:
                     continue
@@ -262,17 +427,39 @@ def registrar_venda():
             for item in itens_venda:
                 item.venda_id = nova_venda.id
                 db.session.add(item)
+
+            if chave:
+                # A restrição UNIQUE garante que só um dos envios concorrentes vence
+                db.session.add(VendaIdempotencia(chave=chave, venda_id=nova_venda.id))
+
+            # Fotografia montada antes do commit, com o que já está em memória:
+            # depois do commit o objeto expira e lê-lo custaria novos SELECTs
+            depois = dados_auditoria(nova_venda, itens=itens_venda)
             
             db.session.commit()
-            
-            flash(f'Venda #{nova_venda.id} de {formatar_moeda(nova_venda.total_venda)} registrada com sucesso!', 'success')
-            return redirect(url_for('lista_vendas'))
+
+        except IntegrityError as e:
+            db.session.rollback()
+            # Outro envio com a mesma chave foi gravado primeiro: devolve a venda dele
+            venda_existente = _venda_por_chave(chave) if chave else None
+            if venda_existente is not None:
+                flash(f'Venda #{venda_existente} já havia sido registrada (envio repetido ignorado).', 'success')
+                return redirect(url_for('lista_vendas'))
+            flash(f'Erro ao registrar a venda: {str(e)}', 'error')
+            return redirect(url_for('registrar_venda'))
 
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao registrar a venda: {str(e)}', 'error')
             return redirect(url_for('registrar_venda'))
 
+        # A venda já está gravada: uma falha na auditoria não pode aparecer como
+        # erro na venda (o caixa reenviaria com outra chave e duplicaria a venda)
+        registrar_auditoria('criar', nova_venda, depois=depois)
+
+        flash(f'Venda #{depois["id"]} de {formatar_moeda(depois["total_venda"])} registrada com sucesso!', 'success')
+        return redirect(url_for('lista_vendas'))
+
     # Rota GET: Serialização JSON
     produtos_query = db.session.execute(select(Produto)).scalars().all()
     produtos_serializados = [{
@@ -293,6 +480,8 @@ def registrar_venda():
         'registrar_venda.html', 
         produtos=produtos_serializados,
         clientes=clientes_serializados, 
+        # Nova chave a cada formulário aberto: reenvios do mesmo formulário repetem a chave
+        chave_idempotencia=uuid.uuid4().hex,
     )
 
 @app.route('/lista/vendas', methods=['GET'])
@@ -313,20 +502,24 @@ def excluir_venda(venda_id):
         
     try:
         venda = db.get_or_404(Venda, venda_id)
+        antes = dados_auditoria(venda)
         
         # Excluir os itens de venda relacionados
         db.session.execute(
             delete(VendaProduto).where(VendaProduto.venda_id == venda_id)
         )
+        # Os itens já carregados para a auditoria foram apagados acima; descarta a coleção
+        db.session.expire(venda, ['itens'])
         
         db.session.delete(venda)
         db.session.commit()
         
-        flash(f'Venda #{venda_id} excluída com sucesso.', 'success')
-        
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao excluir a venda #{venda_id}. Detalhe: {str(e)}', 'error')
+    else:
+        registrar_auditoria('excluir', venda, antes=antes)
+        flash(f'Venda #{venda_id} excluída com sucesso.', 'success')
         
     return redirect(url_for('lista_vendas')) 
 
@@ -437,7 +630,280 @@ def api_vendas_produto_data():
     except Exception as e:
         print(f"Erro ao gerar dados do gráfico: {e}")
         return jsonify({'error': str(e)}), 500
-    
+
+# ----------------------------------------------------
+# 📌 SÉRIE TEMPORAL DE VENDAS POR PRODUTO
+# ----------------------------------------------------
+
+# Granularidades suportadas, da mais fina para a mais grossa:
+# (nome, tamanho do intervalo, formato do rótulo)
+GRANULARIDADES_SERIE = [
+    ('hora', timedelta(hours=1), '%Y-%m-%d %H:00'),
+    ('dia', timedelta(days=1), '%Y-%m-%d'),
+    ('semana', timedelta(weeks=1), '%Y-%m-%d'),
+]
+
+# Limite de pontos por produto no payload. Acima disso a série é reamostrada.
+MAX_PONTOS_SERIE = 400
+
+def _inicio_bucket(momento, granularidade):
+    """Trunca um datetime para o início do seu intervalo (segunda-feira na semana)."""
+    if granularidade == 'hora':
+        return momento.replace(minute=0, second=0, microsecond=0)
+    inicio_dia = momento.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularidade == 'semana':
+        return inicio_dia - timedelta(days=inicio_dia.weekday())
+    return inicio_dia
+
+def _expr_ponto(primeiro, passo_ponto):
+    """
+    Expressão SQL com o índice do ponto da série de cada Venda.data_venda:
+    segundos desde `primeiro` divididos (inteiros) pelo tamanho do ponto.
+    Já agrupa os buckets reamostrados no banco, sem tratar linha a linha em Python.
+    """
+    # Datas sem fuso: as duas pontas são lidas como UTC, então a diferença é exata
+    if db.engine.dialect.name == 'postgresql':
+        segundos = cast(func.floor(func.extract('epoch', Venda.data_venda)), BigInteger)
+    else:
+        segundos = cast(func.strftime('%s', Venda.data_venda), BigInteger)
+    epoch_primeiro = int((primeiro - datetime(1970, 1, 1)).total_seconds())
+    # Nunca negativo (data_venda >= primeiro), então a divisão inteira é o floor
+    return (segundos - epoch_primeiro) // int(passo_ponto.total_seconds())
+
+@app.route('/api/vendas/produto_serie')
+def api_vendas_produto_serie():
+    if not check_login() is None:
+        return jsonify({'error': 'Não Autorizado'}), 401
+
+    data_inicio_str = request.args.get('data_inicio')
+    data_fim_str = request.args.get('data_fim')
+    granularidade_pedida = request.args.get('granularidade', 'auto')
+
+    nomes_validos = [g[0] for g in GRANULARIDADES_SERIE]
+    if granularidade_pedida != 'auto' and granularidade_pedida not in nomes_validos:
+        return jsonify({'error': f'Granularidade inválida. Use auto, {", ".join(nomes_validos)}.'}), 400
+
+    # 1. Define o período
+    try:
+        if data_inicio_str and data_fim_str:
+            data_inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d')
+            data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        else:
+            data_inicio = data_fim = None
+    except ValueError:
+        return jsonify({'error': 'Formato de data inválido. Use AAAA-MM-DD.'}), 400
+
+    if data_inicio is not None and data_fim < data_inicio:
+        return jsonify({'error': 'A data final deve ser posterior à data inicial.'}), 400
+
+    # Limita o período ao intervalo em que existem vendas (sem datas, usa o intervalo completo)
+    # Duas subconsultas separadas: assim cada uma lê só uma ponta de ix_venda_data
+    primeira_venda, ultima_venda = db.session.execute(
+        select(select(func.min(Venda.data_venda)).scalar_subquery(),
+               select(func.max(Venda.data_venda)).scalar_subquery())
+    ).one()
+    if primeira_venda is not None:
+        data_inicio = primeira_venda if data_inicio is None else max(data_inicio, primeira_venda)
+        data_fim = ultima_venda if data_fim is None else min(data_fim, ultima_venda)
+
+    if primeira_venda is None or data_fim < data_inicio:
+        return jsonify({'granularidade': None, 'fator': 1, 'labels': [],
+                        'produtos': [], 'quantidade': [], 'faturamento': []})
+
+    # 2. Escolhe a granularidade: a pedida, ou no modo auto a mais fina que cabe no limite
+    candidatas = GRANULARIDADES_SERIE
+    if granularidade_pedida != 'auto':
+        candidatas = [g for g in GRANULARIDADES_SERIE if g[0] == granularidade_pedida]
+    for granularidade, passo, formato in candidatas:
+        n_buckets = int((data_fim - _inicio_bucket(data_inicio, granularidade)) / passo) + 1
+        if n_buckets <= MAX_PONTOS_SERIE:
+            break
+
+    # Se mesmo a granularidade escolhida excede o limite, junta buckets vizinhos.
+    # Nada abaixo depende de n_buckets: só os n_pontos finais são gerados.
+    fator = -(-n_buckets // MAX_PONTOS_SERIE)
+    n_pontos = -(-n_buckets // fator)
+    primeiro = _inicio_bucket(data_inicio, granularidade)
+    passo_ponto = passo * fator
+
+    # 3. Agregação no banco: um registro por (ponto já reamostrado, produto)
+    ponto = _expr_ponto(primeiro, passo_ponto).label('ponto')
+    stmt = (
+        select(
+            ponto,
+            VendaProduto.produto_id,
+            func.sum(VendaProduto.quantidade).label('quantidade'),
+            func.sum(VendaProduto.quantidade * VendaProduto.preco_unitario).label('faturamento'),
+        )
+        .join(Venda, VendaProduto.venda_id == Venda.id)
+        .where(Venda.data_venda.between(data_inicio, data_fim))
+        .group_by(ponto, VendaProduto.produto_id)
+    )
+
+    try:
+        linhas = db.session.execute(stmt).all()
+
+        # 4. Eixo denso de rótulos já reamostrado (intervalos sem venda aparecem com zero)
+        rotulos = [(primeiro + passo_ponto * j).strftime(formato) for j in range(n_pontos)]
+
+        quantidade = {}
+        faturamento = {}
+        for j, produto_id, qtd, fat in linhas:
+            if not 0 <= j < n_pontos:
+                continue
+            if produto_id not in quantidade:
+                quantidade[produto_id] = [0] * n_pontos
+                faturamento[produto_id] = [0.0] * n_pontos
+            quantidade[produto_id][j] += int(qtd)
+            faturamento[produto_id][j] += float(fat)
+
+        nomes = dict(db.session.execute(
+            select(Produto.id, Produto.nome).where(Produto.id.in_(list(quantidade)))
+        ).all())
+
+        # Produtos ordenados pelo faturamento total no período
+        ordem = sorted(quantidade, key=lambda pid: sum(faturamento[pid]), reverse=True)
+
+        # Formato colunar: uma lista de rótulos e uma linha de valores por produto
+        return jsonify({
+            'granularidade': granularidade,
+            'fator': fator,
+            'labels': rotulos,
+            'produtos': [nomes.get(pid, f'Produto {pid}') for pid in ordem],
+            'quantidade': [quantidade[pid] for pid in ordem],
+            'faturamento': [[round(v, 2) for v in faturamento[pid]] for pid in ordem],
+        })
+
+    except Exception as e:
+        print(f"Erro ao gerar série de vendas: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ----------------------------------------------------
+# 📌 PREVISÃO DE DEMANDA E PLANEJAMENTO DE PRODUÇÃO
+# ----------------------------------------------------
+
+# Um modelo por processo, treinado sob demanda com os dias completos ainda não vistos
+modelo_demanda = ModeloDemanda()
+# RLock: calcular_previsao segura a trava enquanto chama atualizar_modelo_demanda
+trava_modelo_demanda = threading.RLock()
+
+def atualizar_modelo_demanda(retreinar=False):
+    """Incorpora ao modelo as vendas até ontem (ou refaz o treino do zero)."""
+    global modelo_demanda
+
+    with trava_modelo_demanda:
+        if retreinar:
+            modelo_demanda = ModeloDemanda()
+
+        ontem = datetime.now().date() - timedelta(days=1)
+        ultimo_dia = modelo_demanda.ultimo_dia
+        if ultimo_dia is not None and ultimo_dia >= ontem:
+            return modelo_demanda
+
+        # Quantidade vendida por produto e por dia, agregada no banco
+        dia = func.date(Venda.data_venda).label('dia')
+        stmt = (
+            select(VendaProduto.produto_id, dia, func.sum(VendaProduto.quantidade))
+            .join(Venda, VendaProduto.venda_id == Venda.id)
+            .where(Venda.data_venda < datetime.combine(ontem + timedelta(days=1), datetime.min.time()))
+            .group_by(VendaProduto.produto_id, dia)
+        )
+        if ultimo_dia is not None:
+            stmt = stmt.where(Venda.data_venda >= datetime.combine(ultimo_dia + timedelta(days=1), datetime.min.time()))
+
+        linhas = db.session.execute(stmt).all()
+        catalogo = db.session.execute(select(Produto.id)).scalars().all()
+
+        # SQLite devolve a data como texto; PostgreSQL como date
+        dias = [d if not isinstance(d, str) else datetime.strptime(d, '%Y-%m-%d').date() for _, d, _ in linhas]
+        modelo_demanda.atualizar(
+            ontem,
+            [l[0] for l in linhas],
+            dias,
+            [l[2] for l in linhas],
+            catalogo=catalogo,
+        )
+        return modelo_demanda
+
+def calcular_previsao(dia):
+    """Lista de previsões para o dia, ordenada pela sugestão de produção."""
+    # A previsão lê as matrizes sob a mesma trava da atualização, que as altera no lugar
+    with trava_modelo_demanda:
+        modelo = atualizar_modelo_demanda()
+        produto_ids, media, desvio, sugestao = modelo.prever(dia)
+
+    # Só produtos ainda cadastrados aparecem no plano
+    nomes = dict(db.session.execute(select(Produto.id, Produto.nome)).all())
+
+    previsoes = [{
+        'produto_id': int(pid),
+        'nome': nomes[int(pid)],
+        'previsao': round(float(m), 1),
+        'desvio': round(float(d), 1),
+        'sugestao_producao': int(s),
+    } for pid, m, d, s in zip(produto_ids, media, desvio, sugestao) if int(pid) in nomes]
+
+    previsoes.sort(key=lambda p: (-p['sugestao_producao'], p['nome']))
+    return previsoes
+
+def _dia_previsao():
+    # Padrão: amanhã. Aceita ?data=AAAA-MM-DD
+    data_str = request.args.get('data')
+    if data_str:
+        return datetime.strptime(data_str, '%Y-%m-%d').date()
+    return datetime.now().date() + timedelta(days=1)
+
+@app.route('/relatorio/previsao')
+def relatorio_previsao():
+    if not check_login() is None:
+        return check_login()
+
+    try:
+        dia = _dia_previsao()
+    except ValueError:
+        flash("Formato de data inválido. Use AAAA-MM-DD.", 'error')
+        dia = datetime.now().date() + timedelta(days=1)
+
+    if request.args.get('retreinar'):
+        atualizar_modelo_demanda(retreinar=True)
+        flash('Modelo de previsão retreinado com todo o histórico de vendas.', 'success')
+
+    previsoes = calcular_previsao(dia)
+
+    return render_template(
+        'relatorio_previsao.html',
+        previsoes=previsoes,
+        data_previsao=dia.strftime('%Y-%m-%d'),
+        dia_semana=dia_da_semana(dia),
+        treinado_ate=modelo_demanda.ultimo_dia,
+    )
+
+@app.route('/api/previsao/demanda')
+def api_previsao_demanda():
+    if not check_login() is None:
+        return jsonify({'error': 'Não Autorizado'}), 401
+
+    try:
+        dia = _dia_previsao()
+    except ValueError:
+        return jsonify({'error': 'Formato de data inválido. Use AAAA-MM-DD.'}), 400
+
+    try:
+        if request.args.get('retreinar'):
+            atualizar_modelo_demanda(retreinar=True)
+        previsoes = calcular_previsao(dia)
+
+        return jsonify({
+            'data': dia.strftime('%Y-%m-%d'),
+            'dia_semana': dia_da_semana(dia),
+            'treinado_ate': modelo_demanda.ultimo_dia.strftime('%Y-%m-%d'),
+            'previsoes': previsoes,
+        })
+
+    except Exception as e:
+        print(f"Erro ao calcular previsão de demanda: {e}")
+        return jsonify({'error': str(e)}), 500
+
 
 
     
@@ -472,15 +938,19 @@ def cadastro_produto():
                 data_fabricacao=request.form['data_fabricacao']
             )
             db.session.add(novo_produto)
+            db.session.flush()
+            depois = dados_auditoria(novo_produto)
             db.session.commit()
-            flash('Produto cadastrado com sucesso!', 'success')
-            return redirect(url_for('lista_produtos'))
         except IntegrityError:
             db.session.rollback()
             flash('Erro: Nome ou Código de Barras já existem.', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao cadastrar produto: {str(e)}', 'error')
+        else:
+            registrar_auditoria('criar', novo_produto, depois=depois)
+            flash('Produto cadastrado com sucesso!', 'success')
+            return redirect(url_for('lista_produtos'))
 
     return render_template('cadastro_produto.html')
 
@@ -492,20 +962,24 @@ def editar_produto(produto_id):
     produto = db.get_or_404(Produto, produto_id)
 
     if request.method == 'POST':
+        antes = dados_auditoria(produto)
         try:
             produto.nome = request.form['nome']
             produto.valor = float(request.form['valor'].replace(',', '.'))
             produto.codigo_barra = request.form['codigo_barra']
             produto.data_fabricacao = request.form['data_fabricacao']
+            depois = dados_auditoria(produto)
             db.session.commit()
-            flash('Produto atualizado com sucesso!', 'success')
-            return redirect(url_for('lista_produtos'))
         except IntegrityError:
             db.session.rollback()
             flash('Erro: Nome ou Código de Barras já existem.', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao editar produto: {str(e)}', 'error')
+        else:
+            registrar_auditoria('editar', produto, antes=antes, depois=depois)
+            flash('Produto atualizado com sucesso!', 'success')
+            return redirect(url_for('lista_produtos'))
 
     return render_template('editar_produto.html', produto=produto)
 
@@ -515,16 +989,19 @@ def excluir_produto(produto_id):
         return check_login()
     
     produto = db.get_or_404(Produto, produto_id)
+    antes = dados_auditoria(produto)
     try:
         db.session.delete(produto)
         db.session.commit()
-        flash('Produto excluído com sucesso.', 'success')
     except IntegrityError:
         db.session.rollback()
         flash('Erro: Este produto está ligado a vendas existentes e não pode ser excluído.', 'error')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao excluir produto: {str(e)}', 'error')
+    else:
+        registrar_auditoria('excluir', produto, antes=antes)
+        flash('Produto excluído com sucesso.', 'success')
         
     return redirect(url_for('lista_produtos'))
 
@@ -565,16 +1042,19 @@ def cadastro_cliente():
             
             # Consulta Serasa simulada após o cadastro
             novo_cliente.status_credito = consultar_serasa(novo_cliente.cpf)
+            depois = dados_auditoria(novo_cliente)
             db.session.commit() 
-            
-            flash('Cliente cadastrado com sucesso e status de crédito verificado!', 'success')
-            return redirect(url_for('lista_clientes'))
         except IntegrityError:
             db.session.rollback()
             flash('Erro: CPF já existe na base de dados.', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao cadastrar cliente: {str(e)}', 'error')
+        else:
+            registrar_auditoria('criar', novo_cliente, depois=depois)
+            
+            flash('Cliente cadastrado com sucesso e status de crédito verificado!', 'success')
+            return redirect(url_for('lista_clientes'))
 
     return render_template('cadastro_cliente.html')
 
@@ -585,16 +1065,19 @@ def excluir_cliente(cliente_id):
         return check_login()
     
     cliente = db.get_or_404(Cliente, cliente_id)
+    antes = dados_auditoria(cliente)
     try:
         db.session.delete(cliente)
         db.session.commit()
-        flash('Cliente excluído com sucesso.', 'success')
     except IntegrityError:
         db.session.rollback()
         flash('Erro: Este cliente está ligado a vendas existentes e não pode ser excluído.', 'error')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao excluir cliente: {str(e)}', 'error')
+    else:
+        registrar_auditoria('excluir', cliente, antes=antes)
+        flash('Cliente excluído com sucesso.', 'success')
 
     return redirect(url_for('lista_clientes'))
 
@@ -606,6 +1089,7 @@ def editar_cliente(cliente_id):
     cliente = db.get_or_404(Cliente, cliente_id)
 
     if request.method == 'POST':
+        antes = dados_auditoria(cliente)
         try:
             # Note: O CPF é readonly no template, então não o alteramos via POST
             cliente.nome = request.form['nome']
@@ -614,15 +1098,18 @@ def editar_cliente(cliente_id):
             # Permite alterar manualmente o status de crédito (como está no seu editar_cliente.html)
             cliente.status_credito = request.form['status_credito'] 
 
+            depois = dados_auditoria(cliente)
             db.session.commit()
-            flash('Cliente atualizado com sucesso!', 'success')
-            return redirect(url_for('lista_clientes'))
         except IntegrityError:
             db.session.rollback()
             flash('Erro: Já existe um registro com este CPF ou e-mail.', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao editar cliente: {str(e)}', 'error')
+        else:
+            registrar_auditoria('editar', cliente, antes=antes, depois=depois)
+            flash('Cliente atualizado com sucesso!', 'success')
+            return redirect(url_for('lista_clientes'))
 
     return render_template('editar_cliente.html', cliente=cliente)
 
@@ -657,15 +1144,19 @@ def cadastro_funcionario():
                 cargo=request.form['cargo']
             )
             db.session.add(novo_funcionario)
+            db.session.flush()
+            depois = dados_auditoria(novo_funcionario)
             db.session.commit()
-            flash('Funcionário cadastrado com sucesso!', 'success')
-            return redirect(url_for('menu_funcionarios'))
         except IntegrityError:
             db.session.rollback()
             flash('Erro: Usuário (username) já existe.', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao cadastrar funcionário: {str(e)}', 'error')
+        else:
+            registrar_auditoria('criar', novo_funcionario, depois=depois)
+            flash('Funcionário cadastrado com sucesso!', 'success')
+            return redirect(url_for('menu_funcionarios'))
 
     return render_template('cadastro_funcionario.html')
 
@@ -681,16 +1172,19 @@ def excluir_funcionario(funcionario_id):
         flash('Você não pode excluir sua própria conta enquanto estiver logado.', 'error')
         return redirect(url_for('lista_funcionarios'))
 
+    antes = dados_auditoria(funcionario)
     try:
         db.session.delete(funcionario)
         db.session.commit()
-        flash('Funcionário excluído com sucesso.', 'success')
     except IntegrityError:
         db.session.rollback()
         flash('Erro: Este funcionário está ligado a vendas existentes e não pode ser excluído.', 'error')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao excluir funcionário: {str(e)}', 'error')
+    else:
+        registrar_auditoria('excluir', funcionario, antes=antes)
+        flash('Funcionário excluído com sucesso.', 'success')
         
     return redirect(url_for('lista_funcionarios'))
 
@@ -702,6 +1196,7 @@ def editar_funcionario(funcionario_id):
     funcionario = db.get_or_404(Funcionario, funcionario_id)
 
     if request.method == 'POST':
+        antes = dados_auditoria(funcionario)
         try:
             funcionario.nome = request.form['nome']
             funcionario.cargo = request.form['cargo']
@@ -713,15 +1208,20 @@ def editar_funcionario(funcionario_id):
                 
             # O username é readonly no template, não deve ser alterado aqui
 
+            depois = dados_auditoria(funcionario)
+            if nova_senha:
+                depois['password'] = '*** (alterada)'
             db.session.commit()
-            flash('Funcionário atualizado com sucesso!', 'success')
-            return redirect(url_for('lista_funcionarios'))
         except IntegrityError:
             db.session.rollback()
             flash('Erro: Nome de usuário já existe. O username não pode ser alterado.', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao editar funcionário: {str(e)}', 'error')
+        else:
+            registrar_auditoria('editar', funcionario, antes=antes, depois=depois)
+            flash('Funcionário atualizado com sucesso!', 'success')
+            return redirect(url_for('lista_funcionarios'))
 
     return render_template('editar_funcionario.html', funcionario=funcionario)
 
@@ -752,6 +1252,62 @@ def camera_cozinha():
 def menu_relatorios():
     return check_login() or render_template('menu_relatorios.html')
 
+# ----------------------------------------------------
+# 📌 CONSULTA DA AUDITORIA
+# ----------------------------------------------------
+
+@app.route('/api/auditoria')
+def api_auditoria():
+    if not check_login() is None:
+        return jsonify({'error': 'Não Autorizado'}), 401
+
+    entidade = request.args.get('entidade')
+    entidade_id = request.args.get('entidade_id', type=int)
+    data_inicio_str = request.args.get('data_inicio')
+    data_fim_str = request.args.get('data_fim')
+    limite = min(request.args.get('limite', 500, type=int), 5000)
+
+    stmt = select(RegistroAuditoria)
+
+    if entidade:
+        stmt = stmt.where(RegistroAuditoria.entidade == entidade)
+    if entidade_id is not None:
+        stmt = stmt.where(RegistroAuditoria.entidade_id == entidade_id)
+
+    try:
+        if data_inicio_str:
+            stmt = stmt.where(RegistroAuditoria.data_registro >= datetime.strptime(data_inicio_str, '%Y-%m-%d'))
+        if data_fim_str:
+            data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+            stmt = stmt.where(RegistroAuditoria.data_registro <= data_fim)
+    except ValueError:
+        return jsonify({'error': 'Formato de data inválido. Use AAAA-MM-DD.'}), 400
+
+    stmt = stmt.order_by(RegistroAuditoria.data_registro.desc(), RegistroAuditoria.id.desc()).limit(limite)
+
+    try:
+        # Descarrega só o buffer deste processo. Com vários workers (gunicorn -w N)
+        # os registros dos últimos INTERVALO_SEGUNDOS (2 s) feitos em outro worker
+        # podem ainda não aparecer: eles entram na próxima gravação daquele worker.
+        buffer_auditoria.descarregar()
+        registros = db.session.execute(stmt).scalars().all()
+
+        return jsonify({'registros': [{
+            'id': r.id,
+            'data_registro': r.data_registro.isoformat(),
+            'funcionario_id': r.funcionario_id,
+            'username': r.username,
+            'acao': r.acao,
+            'entidade': r.entidade,
+            'entidade_id': r.entidade_id,
+            'antes': json.loads(r.dados_antes) if r.dados_antes else None,
+            'depois': json.loads(r.dados_depois) if r.dados_depois else None,
+        } for r in registros]})
+
+    except Exception as e:
+        print(f"Erro ao consultar auditoria: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ----------------------------------------------------
 # 🚀 EXECUÇÃO DO APLICATIVO
 # ----------------------------------------------------
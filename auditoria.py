@@ -0,0 +1,77 @@
+# auditoria.py
+
+import os
+import threading
+
+
+# ----------------------------------------------------
+# 📌 BUFFER DE AUDITORIA (gravação assíncrona em lotes)
+# ----------------------------------------------------
+# As rotas apenas acrescentam o registro numa lista em memória; uma thread
+# em segundo plano grava os registros acumulados de uma vez a cada
+# INTERVALO_SEGUNDOS (ou antes, quando o lote enche). Assim a auditoria não
+# acrescenta um INSERT síncrono a cada requisição.
+
+INTERVALO_SEGUNDOS = 2.0
+TAMANHO_LOTE = 200
+
+# Se o banco ficar fora do ar, guarda no máximo isto em memória
+MAX_PENDENTES = 10000
+
+
+class BufferAuditoria:
+    """Fila de registros de auditoria descarregada por uma thread de fundo."""
+
+    def __init__(self, gravar_lote, intervalo=INTERVALO_SEGUNDOS, tamanho_lote=TAMANHO_LOTE):
+        # gravar_lote(lista_de_dicts) faz o INSERT em lote e o commit
+        self._gravar_lote = gravar_lote
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self._pendentes = []
+        self._trava = threading.Lock()           # protege a lista de pendentes
+        self._trava_gravacao = threading.Lock()  # um descarregamento por vez
+        self._acordar = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def registrar(self, registro):
+        with self._trava:
+            self._pendentes.append(registro)
+            cheio = len(self._pendentes) >= self.tamanho_lote
+        self._iniciar_thread()
+        if cheio:
+            self._acordar.set()
+
+    def descarregar(self):
+        """Grava imediatamente tudo o que está pendente."""
+        with self._trava_gravacao:
+            with self._trava:
+                lote, self._pendentes = self._pendentes, []
+            if not lote:
+                return 0
+            try:
+                self._gravar_lote(lote)
+            except Exception as e:
+                print(f"Erro ao gravar auditoria ({len(lote)} registros): {e}")
+                # Devolve o lote à fila para a próxima tentativa, na ordem original
+                with self._trava:
+                    self._pendentes = (lote + self._pendentes)[-MAX_PENDENTES:]
+                return 0
+            return len(lote)
+
+    def _iniciar_thread(self):
+        # Verifica o pid: threads não sobrevivem ao fork dos workers do gunicorn
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._trava:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name='auditoria', daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            self.descarregar()
@@ -0,0 +1,315 @@
+# carga.py
+
+"""
+Teste de carga: simula vários caixas (terminais) usando o sistema ao mesmo tempo.
+
+Cada terminal faz login pela rota /login, abre o formulário de venda,
+registra vendas com cestas aleatórias e, de vez em quando, consulta os
+relatórios. A concorrência sobe em degraus (--terminais 1,5,10,20) e, ao
+fim de cada degrau, o script mostra vazão, taxa de erro e percentis de
+latência por rota. O resultado completo é salvo em JSON para comparar
+rodadas (--comparar relatorio_anterior.json).
+
+O servidor precisa estar rodando, com tabelas criadas, o usuário admin e
+alguns produtos cadastrados. Exemplos:
+
+    # SQLite
+    python app.py                                   # cria o banco e o admin
+    gunicorn -w 4 -b 127.0.0.1:8000 app:app
+    python carga.py --url http://127.0.0.1:8000 --terminais 1,5,10,20,40
+
+    # PostgreSQL local
+    DATABASE_URL=postgresql://padaria@localhost/padaria SECRET_KEY=teste gunicorn -w 4 -b 127.0.0.1:8000 app:app
+    python carga.py --url http://127.0.0.1:8000 --comparar carga_sqlite.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, timedelta
+
+
+FORMAS_PAGAMENTO = ['Pix', 'Dinheiro', 'Cartao_Debito', 'Cartao_Credito']
+
+# Quantidade de itens diferentes numa cesta (pesos: a maioria leva poucos itens)
+ITENS_POR_CESTA = [1, 2, 3, 4, 5, 6]
+PESOS_ITENS_POR_CESTA = [30, 30, 20, 10, 6, 4]
+
+
+# ----------------------------------------------------
+# 📌 CLIENTE HTTP DE UM TERMINAL
+# ----------------------------------------------------
+
+class _SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    # O destino do redirecionamento diz se a operação deu certo; não precisamos segui-lo
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Terminal:
+    """Um caixa: sessão própria (cookies) e registro das próprias medições."""
+
+    def __init__(self, url_base, usuario, senha, resultados):
+        self.url_base = url_base.rstrip('/')
+        self.usuario = usuario
+        self.senha = senha
+        self.resultados = resultados
+        self.produtos = []
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _SemRedirecionamento(),
+        )
+
+    def _requisitar(self, rota, metodo='GET', dados=None, params=None):
+        """Faz a requisição sem seguir redirecionamentos. Retorna (latencia, status, corpo, location)."""
+        url = self.url_base + rota
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        corpo = urllib.parse.urlencode(dados, doseq=True).encode() if dados is not None else None
+
+        inicio = time.perf_counter()
+        try:
+            with self.opener.open(urllib.request.Request(url, data=corpo, method=metodo), timeout=60) as resposta:
+                status, texto, location = resposta.status, resposta.read().decode('utf-8', 'replace'), None
+        except urllib.error.HTTPError as e:
+            status, texto, location = e.code, e.read().decode('utf-8', 'replace'), e.headers.get('Location')
+        except Exception as e:
+            status, texto, location = None, repr(e), None
+        return time.perf_counter() - inicio, status, texto, location
+
+    def _medir(self, nome, latencia, ok, detalhe=None):
+        self.resultados.append((nome, latencia, ok, detalhe))
+
+    def login(self):
+        latencia, status, _, location = self._requisitar(
+            '/login', 'POST', {'username': self.usuario, 'password': self.senha})
+        ok = status == 302 and location is not None and 'dashboard' in location
+        self._medir('POST /login', latencia, ok, None if ok else f'status {status}')
+        return ok
+
+    def abrir_formulario_venda(self):
+        """GET do formulário: obtém a chave de idempotência e a lista de produtos."""
+        latencia, status, texto, _ = self._requisitar('/registrar/venda')
+        chave = re.search(r'name="chave_idempotencia" value="([^"]*)"', texto or '')
+        lista = re.search(r"LISTA_PRODUTOS_STRING = '(.*?)';", texto or '')
+        ok = status == 200 and lista is not None
+        self._medir('GET /registrar/venda', latencia, ok, None if ok else f'status {status}')
+        if lista:
+            self.produtos = json.loads(lista.group(1))
+        return chave.group(1) if chave else None
+
+    def registrar_venda(self):
+        chave = self.abrir_formulario_venda()
+        if not self.produtos:
+            return
+
+        n_itens = random.choices(ITENS_POR_CESTA, PESOS_ITENS_POR_CESTA)[0]
+        cesta = random.sample(self.produtos, min(n_itens, len(self.produtos)))
+        dados = {
+            'cliente_id': '',
+            'produto_id[]': [str(p['id']) for p in cesta],
+            'quantidade[]': [str(random.randint(1, 4)) for _ in cesta],
+            'desconto_final': '0.00',
+            'forma_pagamento': random.choice(FORMAS_PAGAMENTO),
+        }
+        if chave:
+            dados['chave_idempotencia'] = chave
+
+        latencia, status, _, location = self._requisitar('/registrar/venda', 'POST', dados)
+        # Sucesso redireciona para a lista de vendas; erro volta ao formulário
+        ok = status == 302 and location is not None and 'lista/vendas' in location
+        self._medir('POST /registrar/venda', latencia, ok, None if ok else f'status {status} -> {location}')
+
+    def consultar_relatorio(self):
+        hoje = date.today()
+        inicio = (hoje - timedelta(days=random.choice([1, 7, 30, 365]))).strftime('%Y-%m-%d')
+        fim = hoje.strftime('%Y-%m-%d')
+        periodo = {'data_inicio': inicio, 'data_fim': fim}
+
+        nome, metodo, rota, dados, params = random.choice([
+            ('GET /api/vendas/produto_data', 'GET', '/api/vendas/produto_data', None, periodo),
+            ('GET /api/vendas/produto_serie', 'GET', '/api/vendas/produto_serie', None, periodo),
+            ('GET /api/previsao/demanda', 'GET', '/api/previsao/demanda', None, None),
+            ('POST /relatorio/vendas/periodo', 'POST', '/relatorio/vendas/periodo', periodo, None),
+        ])
+        latencia, status, _, _ = self._requisitar(rota, metodo, dados, params)
+        ok = status == 200
+        self._medir(nome, latencia, ok, None if ok else f'status {status}')
+
+    def executar(self, ate, proporcao_relatorios, pausa):
+        if not self.login():
+            return
+        while time.perf_counter() < ate:
+            if random.random() < proporcao_relatorios:
+                self.consultar_relatorio()
+            else:
+                self.registrar_venda()
+            if pausa:
+                time.sleep(random.uniform(0, 2 * pausa))
+
+
+# ----------------------------------------------------
+# 📌 ESTATÍSTICAS E RELATÓRIO
+# ----------------------------------------------------
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método do posto mais próximo (valores já ordenados)."""
+    if not valores_ordenados:
+        return None
+    posto = max(1, -(-len(valores_ordenados) * p // 100))
+    return valores_ordenados[int(posto) - 1]
+
+def resumir(resultados, duracao):
+    """Agrupa as medições por rota: vazão, erros e percentis em milissegundos."""
+    por_rota = {}
+    for nome, latencia, ok, detalhe in resultados:
+        rota = por_rota.setdefault(nome, {'latencias': [], 'erros': 0, 'exemplos_erro': []})
+        rota['latencias'].append(latencia)
+        if not ok:
+            rota['erros'] += 1
+            if len(rota['exemplos_erro']) < 3:
+                rota['exemplos_erro'].append(detalhe)
+
+    resumo = {}
+    for nome, rota in sorted(por_rota.items()):
+        latencias = sorted(rota['latencias'])
+        total = len(latencias)
+        resumo[nome] = {
+            'requisicoes': total,
+            'vazao_rps': round(total / duracao, 2),
+            'erros': rota['erros'],
+            'taxa_erro': round(rota['erros'] / total, 4),
+            'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+            'p90_ms': round(percentil(latencias, 90) * 1000, 1),
+            'p95_ms': round(percentil(latencias, 95) * 1000, 1),
+            'p99_ms': round(percentil(latencias, 99) * 1000, 1),
+            'max_ms': round(latencias[-1] * 1000, 1),
+            'exemplos_erro': rota['exemplos_erro'],
+        }
+    return resumo
+
+def executar_degrau(args, n_terminais):
+    resultados = []  # list.append é atômico; cada terminal só acrescenta
+    ate = time.perf_counter() + args.duracao
+    terminais = [Terminal(args.url, args.usuario, args.senha, resultados) for _ in range(n_terminais)]
+    threads = [
+        threading.Thread(target=t.executar, args=(ate, args.proporcao_relatorios, args.pausa), daemon=True)
+        for t in terminais
+    ]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    return {
+        'terminais': n_terminais,
+        'duracao_s': round(duracao, 2),
+        'vazao_total_rps': round(len(resultados) / duracao, 2),
+        'rotas': resumir(resultados, duracao),
+    }
+
+def imprimir_degrau(degrau):
+    print(f"\n== {degrau['terminais']} terminal(is) | {degrau['duracao_s']}s | "
+          f"{degrau['vazao_total_rps']} req/s no total ==")
+    print(f"{'rota':<34}{'req':>7}{'req/s':>9}{'erro%':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for nome, r in degrau['rotas'].items():
+        print(f"{nome:<34}{r['requisicoes']:>7}{r['vazao_rps']:>9}{r['taxa_erro'] * 100:>7.1f}%"
+              f"{r['p50_ms']:>9}{r['p90_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}")
+        for exemplo in r['exemplos_erro']:
+            print(f"    erro: {exemplo}")
+
+def comparar(atual, anterior):
+    """Diferença de vazão e p95 por degrau e rota em relação a uma rodada anterior."""
+    degraus_anteriores = {d['terminais']: d for d in anterior['degraus']}
+    comparacao = []
+    for degrau in atual['degraus']:
+        base = degraus_anteriores.get(degrau['terminais'])
+        if base is None:
+            continue
+        for nome, r in degrau['rotas'].items():
+            b = base['rotas'].get(nome)
+            if b is None:
+                continue
+            comparacao.append({
+                'terminais': degrau['terminais'],
+                'rota': nome,
+                'vazao_rps': [b['vazao_rps'], r['vazao_rps']],
+                'p95_ms': [b['p95_ms'], r['p95_ms']],
+                'taxa_erro': [b['taxa_erro'], r['taxa_erro']],
+            })
+    return comparacao
+
+def imprimir_comparacao(comparacao, arquivo_anterior):
+    print(f"\n== Comparação com {arquivo_anterior} (anterior -> atual) ==")
+    print(f"{'term.':>5}  {'rota':<34}{'req/s':>20}{'p95 ms':>22}{'erro%':>18}")
+    for c in comparacao:
+        (v0, v1), (p0, p1), (e0, e1) = c['vazao_rps'], c['p95_ms'], c['taxa_erro']
+        print(f"{c['terminais']:>5}  {c['rota']:<34}{f'{v0} -> {v1}':>20}{f'{p0} -> {p1}':>22}"
+              f"{f'{e0 * 100:.1f} -> {e1 * 100:.1f}':>18}")
+
+
+# ----------------------------------------------------
+# 🚀 EXECUÇÃO
+# ----------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga simulando caixas simultâneos.')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Endereço do servidor em execução')
+    parser.add_argument('--usuario', default='admin')
+    parser.add_argument('--senha', default='123')
+    parser.add_argument('--terminais', default='1,5,10,20',
+                        help='Degraus de concorrência, separados por vírgula')
+    parser.add_argument('--duracao', type=float, default=20.0, help='Segundos por degrau')
+    parser.add_argument('--proporcao-relatorios', type=float, default=0.1,
+                        help='Fração das ações que são consultas de relatório (0 a 1)')
+    parser.add_argument('--pausa', type=float, default=0.0,
+                        help='Pausa média entre ações de um terminal, em segundos')
+    parser.add_argument('--saida', default=None, help='Arquivo JSON do relatório (padrão: carga_<data>.json)')
+    parser.add_argument('--comparar', default=None, help='Relatório JSON anterior para comparação')
+    parser.add_argument('--semente', type=int, default=None, help='Semente aleatória (cestas reproduzíveis)')
+    args = parser.parse_args()
+
+    if args.semente is not None:
+        random.seed(args.semente)
+
+    degraus = [int(n) for n in args.terminais.split(',') if n.strip()]
+    relatorio = {
+        'url': args.url,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {
+            'terminais': degraus,
+            'duracao_s': args.duracao,
+            'proporcao_relatorios': args.proporcao_relatorios,
+            'pausa_s': args.pausa,
+        },
+        'degraus': [],
+    }
+
+    for n_terminais in degraus:
+        degrau = executar_degrau(args, n_terminais)
+        relatorio['degraus'].append(degrau)
+        imprimir_degrau(degrau)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        relatorio['comparacao'] = {'arquivo': args.comparar, 'rotas': comparar(relatorio, anterior)}
+        imprimir_comparacao(relatorio['comparacao']['rotas'], args.comparar)
+
+    saida = args.saida or f"carga_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\nRelatório salvo em {saida}")
+
+
+if __name__ == '__main__':
+    main()
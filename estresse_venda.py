@@ -0,0 +1,249 @@
+# estresse_venda.py
+
+"""
+Teste de estresse de concorrência do registro de vendas.
+
+Dispara N checkouts em paralelo que compartilham apenas K chaves de
+idempotência (simulando duplos cliques e reenvios em caixas movimentados),
+enquanto outros terminais editam o preço dos mesmos produtos. Ao final
+confere no banco que:
+
+  - exatamente K vendas foram criadas (nenhuma duplicata);
+  - cada chave aponta para uma única venda;
+  - o total de cada venda é a soma dos seus itens (nenhuma atualização perdida)
+    e cada preço gravado é um preço que o produto realmente teve.
+
+O script sobe o próprio app num servidor local com threads. Sem DATABASE_URL
+usa um SQLite temporário; com DATABASE_URL testa o banco informado (por
+exemplo um PostgreSQL local). Nesse caso o funcionário (com senha aleatória),
+os produtos, as vendas, as chaves e a auditoria criados pelo teste são
+apagados ao final, mesmo se o teste falhar.
+
+    python estresse_venda.py --requisicoes 50 --chaves 10
+    DATABASE_URL=postgresql://padaria@localhost/padaria SECRET_KEY=teste python estresse_venda.py
+
+Sai com código 1 se alguma verificação falhar.
+"""
+
+import argparse
+import http.cookiejar
+import os
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'estresse.db')
+    os.environ.setdefault('SECRET_KEY', uuid.uuid4().hex)
+
+from werkzeug.serving import make_server
+
+from app import (app, db, buffer_auditoria, Funcionario, Produto, RegistroAuditoria,
+                 Venda, VendaIdempotencia, VendaProduto)
+from sqlalchemy import delete, func, select
+
+
+# ----------------------------------------------------
+# 📌 CLIENTE HTTP
+# ----------------------------------------------------
+
+class _SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    # O destino do redirecionamento diz se a operação deu certo; não precisamos segui-lo
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Sessao:
+    """Um terminal logado: cookies próprios, sem seguir redirecionamentos."""
+
+    def __init__(self, url_base):
+        self.url_base = url_base
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _SemRedirecionamento(),
+        )
+
+    def post(self, rota, dados):
+        """POST de formulário. Retorna (status, location)."""
+        corpo = urllib.parse.urlencode(dados, doseq=True).encode()
+        try:
+            with self.opener.open(self.url_base + rota, data=corpo, timeout=60) as resposta:
+                return resposta.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location')
+        except Exception as e:
+            return None, repr(e)
+
+    def login(self, usuario, senha):
+        status, location = self.post('/login', {'username': usuario, 'password': senha})
+        return status == 302 and location is not None and 'dashboard' in location
+
+
+# ----------------------------------------------------
+# 📌 PREPARAÇÃO, CARGA E LIMPEZA
+# ----------------------------------------------------
+
+def preparar_banco(n_produtos):
+    """Cria funcionário e produtos exclusivos deste teste. Retorna (login, produto_ids, preço inicial)."""
+    sufixo = uuid.uuid4().hex[:8]
+    # Senha aleatória: nenhum login conhecido fica no banco, nem durante o teste
+    login = {'usuario': f'estresse_{sufixo}', 'senha': uuid.uuid4().hex}
+    with app.app_context():
+        funcionario = Funcionario(username=login['usuario'], password=login['senha'],
+                                  nome='Teste de Estresse', cargo='Teste')
+        produtos = [
+            Produto(nome=f'Estresse {sufixo} {i}', valor=10.0, codigo_barra=f'EST{sufixo}{i}',
+                    data_fabricacao='2025-01-01')
+            for i in range(n_produtos)
+        ]
+        db.session.add(funcionario)
+        db.session.add_all(produtos)
+        db.session.commit()
+        login['funcionario_id'] = funcionario.id
+        return login, [p.id for p in produtos], 10.0
+
+
+def limpar_banco(login, produto_ids):
+    """Apaga tudo o que o teste criou: vendas, itens, chaves, auditoria, produtos e o funcionário."""
+    # Registros de auditoria ainda no buffer seriam gravados depois da limpeza
+    buffer_auditoria.descarregar()
+    with app.app_context():
+        funcionario_id = login['funcionario_id']
+        venda_ids = select(Venda.id).where(Venda.funcionario_id == funcionario_id)
+        db.session.execute(delete(VendaIdempotencia).where(VendaIdempotencia.venda_id.in_(venda_ids)))
+        db.session.execute(delete(VendaProduto).where(VendaProduto.venda_id.in_(venda_ids)))
+        db.session.execute(delete(Venda).where(Venda.funcionario_id == funcionario_id))
+        db.session.execute(delete(Produto).where(Produto.id.in_(produto_ids)))
+        db.session.execute(delete(RegistroAuditoria).where(RegistroAuditoria.funcionario_id == funcionario_id))
+        db.session.execute(delete(Funcionario).where(Funcionario.id == funcionario_id))
+        db.session.commit()
+
+
+def checkout(url, login, chave, produto_ids, barreira, resultados):
+    sessao = Sessao(url)
+    if not sessao.login(login['usuario'], login['senha']):
+        resultados.append(('POST /login', 'falhou'))
+        barreira.abort()
+        return
+    dados = {
+        'produto_id[]': [str(pid) for pid in produto_ids],
+        'quantidade[]': ['2'] * len(produto_ids),
+        'desconto_final': '0.00',
+        'forma_pagamento': 'Pix',
+        'chave_idempotencia': chave,
+    }
+    # Todos os checkouts saem juntos para maximizar a disputa
+    barreira.wait()
+    status, location = sessao.post('/registrar/venda', dados)
+    if not (status == 302 and location is not None and 'lista/vendas' in location):
+        resultados.append(('POST /registrar/venda', f'status {status} -> {location}'))
+
+
+def editar_precos(url, login, produto_ids, precos, barreira, resultados):
+    sessao = Sessao(url)
+    if not sessao.login(login['usuario'], login['senha']):
+        resultados.append(('POST /login', 'falhou'))
+        barreira.abort()
+        return
+    with app.app_context():
+        campos = {p.id: (p.nome, p.codigo_barra, p.data_fabricacao) for p in db.session.execute(
+            select(Produto).where(Produto.id.in_(produto_ids))).scalars()}
+    barreira.wait()
+    for preco in precos:
+        for pid in produto_ids:
+            nome, codigo_barra, data_fabricacao = campos[pid]
+            status, location = sessao.post(f'/editar/produto/{pid}', {
+                'nome': nome, 'valor': f'{preco:.2f}', 'codigo_barra': codigo_barra,
+                'data_fabricacao': data_fabricacao,
+            })
+            if not (status == 302 and location is not None and 'lista/produtos' in location):
+                resultados.append(('POST /editar/produto', f'status {status} -> {location}'))
+
+
+def verificar(funcionario_id, chaves, precos_validos):
+    """Confere duplicatas e consistência dos totais. Retorna a lista de falhas."""
+    falhas = []
+    with app.app_context():
+        vendas = db.session.execute(select(Venda).where(Venda.funcionario_id == funcionario_id)).scalars().all()
+        if len(vendas) != len(chaves):
+            falhas.append(f'{len(vendas)} vendas criadas, esperado {len(chaves)}')
+
+        por_chave = dict(db.session.execute(
+            select(VendaIdempotencia.chave, func.count(VendaIdempotencia.id))
+            .where(VendaIdempotencia.chave.in_(chaves))
+            .group_by(VendaIdempotencia.chave)
+        ).all())
+        sem_venda = [c for c in chaves if por_chave.get(c) != 1]
+        if sem_venda:
+            falhas.append(f'{len(sem_venda)} chave(s) sem exatamente uma venda: {sem_venda[:3]}')
+
+        for venda in vendas:
+            soma_itens = sum(item.quantidade * item.preco_unitario for item in venda.itens)
+            if abs(max(0.0, soma_itens - venda.valor_desconto) - venda.total_venda) > 1e-6:
+                falhas.append(f'Venda #{venda.id}: total {venda.total_venda} != soma dos itens {soma_itens}')
+            for item in venda.itens:
+                if round(item.preco_unitario, 2) not in precos_validos:
+                    falhas.append(f'Venda #{venda.id}: preço {item.preco_unitario} nunca existiu')
+    return falhas
+
+
+def executar(args, login, produto_ids, preco_inicial):
+    servidor = make_server('127.0.0.1', args.porta, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{args.porta}'
+
+    chaves = [uuid.uuid4().hex for _ in range(args.chaves)]
+    precos_por_editor = [[preco_inicial + 1 + e + 0.25 * k for k in range(5)] for e in range(args.editores)]
+    precos_validos = {round(p, 2) for precos in precos_por_editor for p in precos} | {preco_inicial}
+
+    erros = []
+    barreira = threading.Barrier(args.requisicoes + args.editores)
+    threads = [
+        threading.Thread(target=checkout, args=(url, login, chaves[i % args.chaves], produto_ids, barreira, erros))
+        for i in range(args.requisicoes)
+    ] + [
+        threading.Thread(target=editar_precos, args=(url, login, produto_ids, precos, barreira, erros))
+        for precos in precos_por_editor
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        servidor.shutdown()
+
+    falhas = [f'{rota}: {detalhe}' for rota, detalhe in erros[:5]]
+    return falhas + verificar(login['funcionario_id'], chaves, precos_validos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estresse de concorrência do registro de vendas.')
+    parser.add_argument('--requisicoes', type=int, default=50, help='Checkouts disparados em paralelo')
+    parser.add_argument('--chaves', type=int, default=10, help='Chaves de idempotência distintas entre eles')
+    parser.add_argument('--editores', type=int, default=2, help='Terminais editando preços ao mesmo tempo')
+    parser.add_argument('--produtos', type=int, default=3, help='Produtos em cada cesta')
+    parser.add_argument('--porta', type=int, default=5099)
+    args = parser.parse_args()
+
+    login, produto_ids, preco_inicial = preparar_banco(args.produtos)
+    try:
+        falhas = executar(args, login, produto_ids, preco_inicial)
+    finally:
+        limpar_banco(login, produto_ids)
+
+    print(f"{args.requisicoes} checkouts paralelos, {args.chaves} chaves, {args.editores} editores de preço "
+          f"({app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0]})")
+    if falhas:
+        for falha in falhas:
+            print(f"FALHA: {falha}")
+        sys.exit(1)
+    print(f"OK: {args.chaves} vendas, sem duplicatas, totais consistentes com os itens.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# previsao.py
+
+from datetime import date, timedelta
+
+import numpy as np
+
+
+# ----------------------------------------------------
+# 📌 MODELO DE PREVISÃO DE DEMANDA (por produto e dia da semana)
+# ----------------------------------------------------
+# Para cada produto e cada dia da semana o modelo guarda somas ponderadas
+# das quantidades vendidas por dia. O peso de um dia cai pela metade a cada
+# MEIA_VIDA_DIAS, então o histórico recente pesa mais que o antigo.
+#
+# Guardar as somas (e não a média) permite o treino incremental: ao chegar
+# um novo período basta envelhecer as somas antigas e acrescentar os novos
+# dias, sem reler todo o histórico de VendaProduto.
+
+MEIA_VIDA_DIAS = 28
+
+# Quantos desvios-padrão somar à média na sugestão de produção
+Z_SEGURANCA = 0.5
+
+# Abaixo disto (em unidades) a sugestão é não produzir: evita sugerir 1 unidade
+# para produtos com um resto de média perto de zero
+LIMIAR_PRODUCAO = 0.5
+
+# Marca de produto que ainda não teve nenhuma venda
+SEM_INICIO = np.iinfo(np.int64).max
+
+
+class ModeloDemanda:
+    """Médias ponderadas de vendas diárias por produto e dia da semana."""
+
+    def __init__(self, meia_vida_dias=MEIA_VIDA_DIAS):
+        self.decaimento = 0.5 ** (1.0 / meia_vida_dias)
+        self.produto_ids = np.zeros(0, dtype=np.int64)
+        self.soma = np.zeros((0, 7))       # soma de peso * quantidade
+        self.soma_quad = np.zeros((0, 7))  # soma de peso * quantidade²
+        self.peso = np.zeros((0, 7))       # soma dos pesos de cada dia da semana
+        self.inicio = np.zeros(0, dtype=np.int64)  # ordinal da primeira venda de cada produto
+        self.ultimo_dia = None             # último dia (inclusive) já incorporado
+
+    def _indices(self, produto_ids):
+        """Índice de cada produto nas matrizes, incluindo produtos novos."""
+        produto_ids = np.asarray(produto_ids, dtype=np.int64)
+        novos = np.setdiff1d(produto_ids, self.produto_ids)
+        if novos.size:
+            self.produto_ids = np.concatenate([self.produto_ids, novos])
+            zeros = np.zeros((novos.size, 7))
+            self.soma = np.vstack([self.soma, zeros])
+            self.soma_quad = np.vstack([self.soma_quad, zeros])
+            self.peso = np.vstack([self.peso, zeros])
+            self.inicio = np.concatenate([self.inicio, np.full(novos.size, SEM_INICIO, dtype=np.int64)])
+        ordem = np.argsort(self.produto_ids)
+        posicao = np.searchsorted(self.produto_ids, produto_ids, sorter=ordem)
+        return ordem[posicao]
+
+    def atualizar(self, dia_fim, produto_ids, dias, quantidades, catalogo=()):
+        """
+        Incorpora as vendas diárias do período (ultimo_dia, dia_fim].
+
+        `produto_ids`, `dias` e `quantidades` são vetores paralelos com a
+        quantidade total vendida de cada produto em cada dia (`dias` como
+        datetime.date). Cada produto só acumula peso a partir da sua primeira
+        venda: dias sem venda depois dela contam como zero, dias antes dela
+        não contam. Assim o resultado não depende de como o histórico foi
+        dividido entre as atualizações. `catalogo` registra produtos ainda
+        sem vendas.
+        """
+        dias_ord = np.array([d.toordinal() for d in dias], dtype=np.int64)
+        quantidades = np.asarray(quantidades, dtype=float)
+
+        if self.ultimo_dia is None:
+            dia_inicio = date.fromordinal(int(dias_ord.min())) if dias_ord.size else dia_fim
+        else:
+            dia_inicio = self.ultimo_dia + timedelta(days=1)
+        if dia_fim < dia_inicio:
+            return
+
+        idx = self._indices(np.concatenate([np.asarray(catalogo, dtype=np.int64),
+                                            np.asarray(produto_ids, dtype=np.int64)]))
+        idx = idx[len(catalogo):]
+
+        # 1. Envelhece o histórico já acumulado até o novo dia_fim
+        if self.ultimo_dia is not None:
+            fator = self.decaimento ** (dia_fim - self.ultimo_dia).days
+            self.soma *= fator
+            self.soma_quad *= fator
+            self.peso *= fator
+
+        periodo = np.arange(dia_inicio.toordinal(), dia_fim.toordinal() + 1)
+        dentro = (dias_ord >= periodo[0]) & (dias_ord <= periodo[-1])
+        idx, dias_ord, quantidades = idx[dentro], dias_ord[dentro], quantidades[dentro]
+
+        # 2. Primeira venda dos produtos que ainda não tinham vendido
+        np.minimum.at(self.inicio, idx, dias_ord)
+
+        # 3. Peso dos dias do período a partir da primeira venda de cada produto.
+        # sufixo[k, d] = soma dos pesos dos dias da semana d com posição >= k no período
+        pesos_periodo = self.decaimento ** (dia_fim.toordinal() - periodo)
+        # date.fromordinal(1) é segunda-feira: (ordinal - 1) % 7 == weekday()
+        por_dia = np.zeros((periodo.size + 1, 7))
+        por_dia[np.arange(periodo.size), (periodo - 1) % 7] = pesos_periodo
+        sufixo = np.cumsum(por_dia[::-1], axis=0)[::-1]
+
+        ativos = self.inicio <= periodo[-1]
+        deslocamento = np.clip(self.inicio[ativos] - periodo[0], 0, periodo.size)
+        self.peso[ativos] += sufixo[deslocamento]
+
+        # 4. Quantidades vendidas no período (dias fora dele são ignorados)
+        pesos = self.decaimento ** (dia_fim.toordinal() - dias_ord)
+        dia_semana = (dias_ord - 1) % 7
+        np.add.at(self.soma, (idx, dia_semana), pesos * quantidades)
+        np.add.at(self.soma_quad, (idx, dia_semana), pesos * quantidades ** 2)
+
+        self.ultimo_dia = dia_fim
+
+    def prever(self, dia, z=Z_SEGURANCA):
+        """
+        Previsão de demanda de todos os produtos para o dia informado.
+
+        Retorna (produto_ids, media, desvio, sugestao) como vetores NumPy;
+        `sugestao` é a média acrescida de `z` desvios, arredondada para cima,
+        ou zero quando esse valor fica abaixo de LIMIAR_PRODUCAO.
+        """
+        coluna = dia.weekday()
+        peso = self.peso[:, coluna]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = np.where(peso > 0, self.soma[:, coluna] / peso, 0.0)
+            variancia = np.where(peso > 0, self.soma_quad[:, coluna] / peso - media ** 2, 0.0)
+        desvio = np.sqrt(np.clip(variancia, 0.0, None))
+        alvo = media + z * desvio
+        sugestao = np.where(alvo < LIMIAR_PRODUCAO, 0, np.ceil(alvo - 1e-9)).astype(np.int64)
+        return self.produto_ids.copy(), media, desvio, sugestao
+
+
+def dia_da_semana(dia):
+    nomes = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+    return nomes[dia.weekday()]
+